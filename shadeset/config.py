@@ -36,3 +36,8 @@ attributes = os.getenv(
     'SHADESET_ATTRIBUTES',
     'aiOpaque'
 ).split()
+
+cache_root = os.getenv(
+    'SHADESET_CACHE',
+    os.path.expanduser('~/.shadeset/cache').replace('\\', '/')
+)
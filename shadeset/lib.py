@@ -303,3 +303,15 @@ def set_export_attrs(attrs):
     '''Set the list of attributes to include in publishes'''
 
     config.attributes = attrs
+
+
+def get_cache_root():
+    '''Get the per-user directory used to cache parsed shadesets'''
+
+    return config.cache_root
+
+
+def set_cache_root(path):
+    '''Set the per-user directory used to cache parsed shadesets'''
+
+    config.cache_root = path
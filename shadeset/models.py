@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
 # Standard library imports
+import hashlib
+import io
 import os
+import pickle
 import shutil
 from collections import defaultdict
 from contextlib import contextmanager
@@ -28,19 +31,33 @@ class ShadeSet(dict):
         self.root = None
         self.name = None
         if self.path:
-            self.root = os.path.dirname(self.path)
-            self.name = os.path.splitext(os.path.basename(self.path))[0]
+            self.root, basename = os.path.split(self.path)
+            self.name = basename.rpartition('.')[0] or basename
         super(ShadeSet, self).__init__(*args, **kwargs)
 
     def relative(self, path):
         return os.path.join(self.root, path)
 
     @classmethod
-    def load(cls, shade_path):
-        '''Load scene shading data from an exported shadeset'''
+    def load(cls, shade_path, cache=True):
+        '''Load scene shading data from an exported shadeset.
 
-        with open(shade_path, 'r') as f:
-            shade_data = yaml.load(f.read())
+        Parsed data is cached in a per-user pickle file and reused until the
+        yml file's modification time or size changes. Pass cache=False to
+        always parse the yml file.
+        '''
+
+        shade_data = None
+        if cache:
+            cache_path = get_cache_path(shade_path)
+            cache_key = get_cache_key(shade_path)
+            shade_data = read_cache(cache_path, cache_key)
+
+        if shade_data is None:
+            with io.open(shade_path, 'rb', buffering=1 << 20) as f:
+                shade_data = yaml.safe_load(f)
+            if cache:
+                write_cache(cache_path, cache_key, shade_data)
 
         return cls(shade_path, shade_data)
 
@@ -97,6 +114,11 @@ class ShadeSet(dict):
     def apply(self, selection=False, render_layers=False):
         '''Apply this `ShadeSet` to the currently opened scene'''
 
+        with utils.undo_chunk(), utils.suspended_refresh():
+            self._apply(selection, render_layers)
+
+    def _apply(self, selection, render_layers):
+
         for subset in self.registry:
             subset.apply(self, selection=selection)
 
@@ -144,11 +166,107 @@ class ShadeSet(dict):
         for subset in self.registry:
             subset.export(self, outdir, name)
 
+        # Dump to a hidden temp file first so a failed dump never leaves a
+        # truncated yml that lib.get_publishes would list as a version
         shade_path = os.path.join(outdir, name + '.yml')
-        encoded = yaml.safe_dump(dict(self), default_flow_style=False)
+        temp_path = os.path.join(outdir, '.' + name + '.yml.tmp')
+        try:
+            with open(temp_path, 'w') as f:
+                yaml.safe_dump(dict(self), f, default_flow_style=False)
+            if os.path.exists(shade_path):
+                os.remove(shade_path)
+            os.rename(temp_path, shade_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+MAX_CACHE_FILES = 100
+
+
+def get_cache_path(source_path):
+    '''Get the pickle cache path for source_path in the per-user cache root.
+
+    Caches are kept out of publish folders so ShadeSet.load never unpickles
+    a file that other users can write to.
+    '''
+
+    source_path = utils.normalize_path(source_path)
+    if not isinstance(source_path, bytes):
+        source_path = source_path.encode('utf-8')
+    digest = hashlib.md5(source_path).hexdigest()
+    return os.path.join(lib.get_cache_root(), digest + '.pkl')
+
 
-        with open(shade_path, 'w') as f:
-            f.write(encoded)
+def get_cache_key(source_path):
+    '''Get the (mtime, size) of source_path used to validate caches.'''
+
+    stat = os.stat(source_path)
+    return stat.st_mtime, stat.st_size
+
+
+def read_cache(cache_path, key):
+    '''Read pickled data from cache_path if it was written for key.
+
+    Returns None when the cache is missing, stale or unreadable.
+    '''
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cache_key, data = pickle.load(f)
+    except Exception:
+        return
+
+    if tuple(cache_key) != key:
+        return
+
+    # Mark the cache as recently used so prune_cache keeps it
+    try:
+        os.utime(cache_path, None)
+    except OSError:
+        pass
+    return data
+
+
+def write_cache(cache_path, key, data):
+    '''Pickle data and its key to cache_path. Failing to write the cache is
+    not an error.
+
+    Protocol 2 is used so caches can be read by both Python 2 and 3.
+    '''
+
+    try:
+        cache_dir = os.path.dirname(cache_path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(cache_path, 'wb') as f:
+            pickle.dump((key, data), f, protocol=2)
+        prune_cache(cache_dir)
+    except (IOError, OSError):
+        pass
+
+
+def prune_cache(cache_dir, max_files=None):
+    '''Remove the least recently used caches in cache_dir, keeping at most
+    max_files. Defaults to MAX_CACHE_FILES.'''
+
+    if max_files is None:
+        max_files = MAX_CACHE_FILES
+
+    cache_paths = [
+        os.path.join(cache_dir, f)
+        for f in os.listdir(cache_dir)
+        if f.endswith('.pkl')
+    ]
+    if len(cache_paths) <= max_files:
+        return
+
+    cache_paths.sort(key=os.path.getmtime, reverse=True)
+    for cache_path in cache_paths[max_files:]:
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
 
 
 class SubSet(object):
@@ -188,24 +306,21 @@ class ShadingGroupsSet(SubSet):
         else:
             transforms = cmds.ls(long=True, transforms=True)
 
-        shading_groups = []
-        for t in transforms:
-            sgs = utils.get_shading_groups(t)
-            if sgs:
-                shading_groups.extend(sgs)
-
-        shading_groups = set(shading_groups)
+        shading_groups = utils.get_shading_groups_of(transforms)
 
+        sg_members = {}
         for sg in shading_groups:
             members = utils.get_members(sg)
-            if not members:
-                continue
+            if members:
+                sg_members[sg] = members
+
+        ids = utils.tag_ids(list(sg_members))
 
-            _id = utils.add_id(sg)
-            members = utils.filter_bad_face_assignments(members)
+        for sg, members in sg_members.items():
+            members = utils.iter_bad_face_assignments(members)
             members = utils.shorten_names(members)
             data[str(sg)] = {
-                'meta_id': _id,
+                'meta_id': ids[sg],
                 'members': members,
             }
 
@@ -220,31 +335,42 @@ class ShadingGroupsSet(SubSet):
         utils.reference_shader(path, namespace='sg')
 
     def export(self, shade_set, outdir, name):
-        shading_groups = shade_set['shadingGroups'].keys()
-        if 'render_layers' in shade_set:
-            for render_layer, data in shade_set['render_layers'].items():
-                shading_groups.extend(data['shadingGroups'].keys())
-        shading_groups = list(set(shading_groups))
+        shading_groups = set(shade_set['shadingGroups'])
+        for data in shade_set.get('render_layers', {}).values():
+            shading_groups.update(data.get('shadingGroups', ()))
 
         path = os.path.join(outdir, name + '_shadingGroups.mb')
         utils.export_shader(shading_groups, path)
 
     def apply(self, shade_set, selection=False):
 
-        for sg, sg_data in shade_set['shadingGroups'].items():
-            if sg == 'initialShadingGroup':
-                shading_group = 'initialShadingGroup'
-            else:
-                shading_group = utils.node_from_id(sg_data['meta_id'])
+        # Gather the selected hierarchies once per apply pass
+        descendants = None
+        if selection:
+            descendants = utils.get_descendants(cmds.ls(sl=True, long=True))
+
+        # initialShadingGroup is never exported with a meta_id
+        shading_groups = dict(shade_set['shadingGroups'])
+        default_data = shading_groups.pop('initialShadingGroup', None)
+        if default_data:
+            members = self.find_members(default_data, descendants)
+            utils.assign_shading_group('initialShadingGroup', members)
+
+        for sg_data in shading_groups.values():
+            shading_group = utils.node_from_id(sg_data['meta_id'])
+            members = self.find_members(sg_data, descendants)
+            utils.assign_shading_group(shading_group, members)
 
-            members = utils.find_members(sg_data['members'])
+    def find_members(self, sg_data, descendants=None):
+        '''Find scene members of a shading group, limited to the set of
+        descendants when provided.'''
 
-            if selection:
-                nodes = cmds.ls(sl=True, long=True)
-                members = [m for m in members
-                           if utils.member_in_hierarchy(m, *nodes)]
+        members = utils.find_members(sg_data['members'])
 
-            utils.assign_shading_group(shading_group, members)
+        if descendants is not None:
+            members = utils.members_in_hierarchy(members, descendants)
+
+        return members
 
 
 class CustomAttributesSet(SubSet):
@@ -258,21 +384,26 @@ class CustomAttributesSet(SubSet):
             shapes = [utils.get_shape(n) for n in cmds.ls(sl=True, long=True)]
         else:
             shapes = [
-                utils.get_shape(n)
+                utils.get_transform_shape(n)
                 for n in cmds.ls(long=True, transforms=True)
             ]
 
+        prefixes = tuple(lib.get_export_attr_prefixes())
+        export_attrs = lib.get_export_attrs()
+
         for shape in shapes:
             short_name = utils.shorten_name(shape)
             shape_data = {}
-            for prefix in lib.get_export_attr_prefixes():
-                attrs = utils.get_prefixed_attrs(shape, prefix)
-                for attr in attrs:
+
+            # List attributes once and match prefixes and names in python
+            shape_attrs = cmds.listAttr(shape) or []
+            for attr in shape_attrs:
+                if prefixes and attr.startswith(prefixes):
                     shape_data[attr] = utils.get_attr_data(shape, attr)
 
-            for attr in lib.get_export_attrs():
-                attr_path = shape + '.' + attr
-                if cmds.objExists(attr_path):
+            existing = set(shape_attrs)
+            for attr in export_attrs:
+                if attr in existing:
                     shape_data[attr] = utils.get_attr_data(shape, attr)
 
             data[short_name] = shape_data
@@ -284,14 +415,18 @@ class CustomAttributesSet(SubSet):
         if 'customAttributes' not in shade_set:
             return
 
-        for shape, attrs in shade_set['customAttributes'].items():
+        if selection:
+            descendants = utils.get_descendants(cmds.ls(sl=True, long=True))
+
+        custom_attributes = shade_set['customAttributes']
+        shape_members = utils.find_shapes(custom_attributes.keys())
+
+        for shape, attrs in custom_attributes.items():
 
-            members = utils.find_shape(shape)
+            members = shape_members[shape]
 
             if selection:
-                nodes = cmds.ls(sl=True, long=True)
-                members = [m for m in members
-                           if utils.member_in_hierarchy(m, *nodes)]
+                members = utils.members_in_hierarchy(members, descendants)
 
             for attr_name, attr_data in attrs.items():
                 for member in members:
@@ -323,6 +458,7 @@ class RenderLayer(object):
 
     def __init__(self, name):
         self.name = name
+        self._hash = hash(name)
 
     def __repr__(self):
         return self.name
@@ -331,10 +467,15 @@ class RenderLayer(object):
         return self.name
 
     def __hash__(self):
-        return hash(self.name)
+        return self._hash
 
     def __eq__(self, other):
-        return str(self) == str(other)
+        if isinstance(other, RenderLayer):
+            return self.name == other.name
+        return self.name == other
+
+    def __ne__(self, other):
+        return not self == other
 
     @property
     def exists(self):
@@ -378,11 +519,13 @@ class RenderLayer(object):
 @contextmanager
 def RenderLayers(layers):
     '''Context manager that yields a RenderLayer generator. Restores the
-    previously active render layer afterwards.'''
+    previously active render layer afterwards. Viewport refresh is suspended
+    while switching between layers.'''
 
     old_layer = RenderLayer.active()
 
-    try:
-        yield (RenderLayer(layer) for layer in layers)
-    finally:
-        old_layer.activate()
+    with utils.suspended_refresh():
+        try:
+            yield (RenderLayer(layer) for layer in layers)
+        finally:
+            old_layer.activate()
@@ -6,7 +6,11 @@ from os.path import abspath, dirname, join
 
 
 res_package = dirname(__file__)
+_path_cache = {}
 
 
 def get_path(*parts):
-    return abspath(join(res_package, *parts)).replace('\\', '/')
+    if parts not in _path_cache:
+        path = abspath(join(res_package, *parts)).replace('\\', '/')
+        _path_cache[parts] = path
+    return _path_cache[parts]
@@ -3,7 +3,9 @@ from __future__ import print_function
 
 # Standard library imports
 import os
-from fnmatch import fnmatch
+import re
+from fnmatch import translate
+from operator import itemgetter
 
 # Local imports
 from . import res
@@ -89,7 +91,6 @@ class ExportForm(QtWidgets.QWidget):
         self.suffix.textChanged.connect(self.update_preview)
 
         self.update_form()
-        self.update_preview()
 
     def state(self):
         asset_item = self.asset.currentItem()
@@ -107,16 +108,22 @@ class ExportForm(QtWidgets.QWidget):
         )
 
     def add_asset(self, asset):
-        item = QtWidgets.QListWidgetItem()
-        item.setText(asset['asset'])
+        item = QtWidgets.QListWidgetItem(asset['asset'], self.asset)
         item.asset = asset
-        self.asset.addItem(item)
 
     def update_form(self):
-        self.asset.clear()
-        assets = lib.get_assets(lib.session['project'])
-        for _, asset in sorted(assets.items()):
-            self.add_asset(asset)
+        self.asset.blockSignals(True)
+        self.asset.setUpdatesEnabled(False)
+        try:
+            self.asset.clear()
+            assets = lib.get_assets(lib.session['project'])
+            for _, asset in sorted(assets.items(), key=itemgetter(0)):
+                self.add_asset(asset)
+        finally:
+            self.asset.setUpdatesEnabled(True)
+            self.asset.blockSignals(False)
+
+        self.update_preview()
 
     def update_preview(self):
         state = self.state()
@@ -247,10 +254,8 @@ class ImportForm(QtWidgets.QWidget):
         self.update_asset_widget()
 
     def add_asset(self, asset):
-        item = QtWidgets.QListWidgetItem()
-        item.setText(asset['asset'])
+        item = QtWidgets.QListWidgetItem(asset['asset'], self.asset)
         item.asset = asset
-        self.asset.addItem(item)
 
     def on_project_changed(self):
         project = self.project.currentText()
@@ -258,29 +263,49 @@ class ImportForm(QtWidgets.QWidget):
         self.update_asset_widget()
 
     def update_asset_widget(self):
-        self.asset.clear()
-        assets = lib.get_assets(lib.session['project'])
-        for _, asset in sorted(assets.items()):
-            self.add_asset(asset)
+        self.asset.blockSignals(True)
+        self.asset.setUpdatesEnabled(False)
+        try:
+            self.asset.clear()
+            assets = lib.get_assets(lib.session['project'])
+            for _, asset in sorted(assets.items(), key=itemgetter(0)):
+                self.add_asset(asset)
+        finally:
+            self.asset.setUpdatesEnabled(True)
+            self.asset.blockSignals(False)
+
+        self.update_shadeset_widget()
 
     def on_asset_changed(self):
         self.update_shadeset_widget()
 
     def add_shadeset(self, publish):
-        item = QtWidgets.QListWidgetItem()
-        item.setText(publish['basename'].rsplit('.', 1)[0])
+        text = publish['basename'].rsplit('.', 1)[0]
+        item = QtWidgets.QListWidgetItem(text, self.shadeset)
         item.publish = publish
-        self.shadeset.addItem(item)
 
     def update_shadeset_widget(self):
-        self.shadeset.clear()
-
-        state = self.state()
-        if state['asset']:
-            publishes = lib.get_publishes(state['asset'])
-            for name, versions in sorted(publishes.items()):
-                for version, publish in sorted(versions.items()):
+        self.shadeset.blockSignals(True)
+        self.shadeset.setUpdatesEnabled(False)
+        try:
+            self.shadeset.clear()
+
+            state = self.state()
+            if state['asset']:
+                publishes = lib.get_publishes(state['asset'])
+                flat = sorted(
+                    (
+                        (name, version, publish)
+                        for name, versions in publishes.items()
+                        for version, publish in versions.items()
+                    ),
+                    key=itemgetter(0, 1),
+                )
+                for _, _, publish in flat:
                     self.add_shadeset(publish)
+        finally:
+            self.shadeset.setUpdatesEnabled(True)
+            self.shadeset.blockSignals(False)
 
     def apply(self):
         # TODO: Move to controller
@@ -297,20 +322,12 @@ class ImportForm(QtWidgets.QWidget):
 
         reference_shadeset = True
         pattern = publish['path'].split('.')[0] + '.*_shadingGroups.mb'
+        pattern_re = re.compile(translate(os.path.normcase(pattern)))
         shaders_path = publish['path'].replace('.yml', '_shadingGroups.mb')
         norm_path = os.path.normpath(shaders_path)
         file_name = os.path.basename(norm_path)
 
-        for ref in cmds.ls(references=True):
-            # Ignore loose reference nodes
-            try:
-                ref_path = cmds.referenceQuery(ref, filename=True)
-                ref_path = ref_path.split('{')[0]
-            except RuntimeError as e:
-                if "not associated with a reference file" in str(e):
-                    continue
-                raise
-
+        for ref, ref_path in utils.get_reference_paths().items():
             ref_name = os.path.basename(ref_path)
             if norm_path == os.path.normpath(ref_path):
                 response = QtWidgets.QMessageBox.question(
@@ -328,7 +345,7 @@ class ImportForm(QtWidgets.QWidget):
                 cmds.select(sel, replace=True)
                 reference_shadeset = False
 
-            elif fnmatch(ref_path, pattern):
+            elif pattern_re.match(os.path.normcase(ref_path)):
 
                 response = QtWidgets.QMessageBox.question(
                     self,
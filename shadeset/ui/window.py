@@ -22,6 +22,10 @@ except NameError:
     long = int
 
 
+with open(res.get_path('style.css')) as f:
+    STYLESHEET = f.read()
+
+
 class ShadesetUI(MayaQWidgetDockableMixin, QtWidgets.QWidget):
 
     _instance = None
@@ -34,13 +38,17 @@ class ShadesetUI(MayaQWidgetDockableMixin, QtWidgets.QWidget):
         self.tabs.setDocumentMode(True)
         tabs_bar = self.tabs.tabBar()
         tabs_bar.setDrawBase(False)
-        self.import_tab = ImportForm(self.tabs)
-        self.export_tab = ExportForm(self.tabs)
-        self.config_tab = ConfigForm(self.tabs)
-        self.config_tab.config_changed.connect(self.on_config_changed)
-        self.tabs.addTab(self.import_tab, 'Import')
-        self.tabs.addTab(self.export_tab, 'Export')
-        self.tabs.addTab(self.config_tab, 'Config')
+
+        # Tabs are built the first time they are shown
+        self._tab_builders = [
+            ('Import', ImportForm),
+            ('Export', ExportForm),
+            ('Config', ConfigForm),
+        ]
+        self._tab_instances = {}
+        for label, _ in self._tab_builders:
+            self.tabs.addTab(QtWidgets.QWidget(), label)
+        self.get_tab(0)
         self.tabs.currentChanged.connect(self.on_tab_changed)
 
         layout = QtWidgets.QVBoxLayout()
@@ -51,15 +59,52 @@ class ShadesetUI(MayaQWidgetDockableMixin, QtWidgets.QWidget):
 
         self.setLayout(layout)
         self.setWindowTitle('Shadesets')
-        self.setStyleSheet(open(res.get_path('style.css')).read())
+        self.setStyleSheet(STYLESHEET)
+
+    @property
+    def import_tab(self):
+        return self.get_tab(0)
+
+    @property
+    def export_tab(self):
+        return self.get_tab(1)
+
+    @property
+    def config_tab(self):
+        return self.get_tab(2)
+
+    def get_tab(self, index):
+        '''Get the form for a tab, replacing its placeholder on first use.'''
+
+        if index in self._tab_instances:
+            return self._tab_instances[index]
+
+        label, builder = self._tab_builders[index]
+        tab = builder(self.tabs)
+        if isinstance(tab, ConfigForm):
+            tab.config_changed.connect(self.on_config_changed)
+
+        current_index = self.tabs.currentIndex()
+        placeholder = self.tabs.widget(index)
+        self.tabs.blockSignals(True)
+        try:
+            self.tabs.removeTab(index)
+            self.tabs.insertTab(index, tab, label)
+            self.tabs.setCurrentIndex(current_index)
+        finally:
+            self.tabs.blockSignals(False)
+        placeholder.deleteLater()
+
+        self._tab_instances[index] = tab
+        return tab
 
     def on_tab_changed(self, index):
-        if index == 0:
-            self.import_tab.update_form()
-        elif index == 1:
-            self.export_tab.update_form()
-        else:
-            self.config_tab.update_form()
+        if index not in self._tab_instances:
+            # New forms are populated when they are constructed
+            self.get_tab(index)
+            return
+
+        self._tab_instances[index].update_form()
 
     def on_config_changed(self):
         pass
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import uuid
 from contextlib import contextmanager
 from functools import wraps
@@ -8,12 +9,23 @@ from maya import cmds
 import maya.api.OpenMaya as om
 
 
+BAD_FACE_PATTERN = re.compile(r'\.f\[0:(\d+)\]$')
+
+
 def get_mfn(node):
     sel = om.MSelectionList()
     sel.add(node)
     return om.MFnDependencyNode(sel.getDependNode(0))
 
 
+def get_plug(path):
+    '''Get the MPlug for a node.attribute path'''
+
+    sel = om.MSelectionList()
+    sel.add(path)
+    return sel.getPlug(0)
+
+
 def get_history(nodes):
     inputs = []
     for node in nodes:
@@ -41,18 +53,26 @@ def get_shapes_in_hierarchy(node):
 
     :param node: Name of transform node'''
 
-    shapes = set()
+    shapes = cmds.ls(
+        node,
+        dag=True,
+        type=('mesh', 'nurbsSurface'),
+        noIntermediate=True,
+        long=True,
+    )
+    return list(set(shapes or ()))
 
-    children = cmds.ls(node, dag=True, type='transform', long=True)
-    for child in children:
-        shape = get_shape(child)
-        if shape:
-            shapes.add(shape)
 
-    return list(shapes)
+def get_parents(node):
+    '''Get the full paths of all parents of node, nearest first.
 
+    Parents of long dag paths are read from the path itself.
+    '''
 
-def get_parents(node):
+    node = node.partition('.')[0]
+    if node.startswith('|'):
+        parts = node.split('|')
+        return ['|'.join(parts[:i]) for i in range(len(parts) - 1, 1, -1)]
 
     result = []
 
@@ -64,27 +84,38 @@ def get_parents(node):
     return result
 
 
+SHAPE_TYPES = ('mesh', 'nurbsSurface')
+
+
 def get_shape(node):
     '''Get a non-intermediate mesh shape from a transform
 
     :param node: Name of transform node
     '''
 
-    valid_types = ['mesh', 'nurbsSurface']
-    if cmds.nodeType(node) in valid_types:
+    if cmds.nodeType(node) in SHAPE_TYPES:
         node = cmds.listRelatives(node, parent=True, fullPath=True)
 
-    for typ in valid_types:
-        children = cmds.listRelatives(
-            node,
-            shapes=True,
-            noIntermediate=True,
-            type=typ,
-            fullPath=True,
-        )
+    return get_transform_shape(node)
+
+
+def get_transform_shape(transform):
+    '''Get a non-intermediate mesh shape from a node known to be a transform.
 
-        if children:
-            return children[0]
+    Skips the node type query made by get_shape.
+
+    :param transform: Name of transform node
+    '''
+
+    children = cmds.listRelatives(
+        transform,
+        shapes=True,
+        noIntermediate=True,
+        type=SHAPE_TYPES,
+        fullPath=True,
+    )
+    if children:
+        return children[0]
 
 
 def maintains_selection(fn):
@@ -118,13 +149,48 @@ def selection(*args, **kwargs):
         cmds.select(old_selection)
 
 
+_refresh_suspend_depth = 0
+
+
+@contextmanager
+def suspended_refresh():
+    '''Suspend viewport refresh until the outermost suspended_refresh exits.
+
+    refresh can not be queried, so nesting is tracked with a depth counter.
+    '''
+
+    global _refresh_suspend_depth
+
+    if not _refresh_suspend_depth:
+        cmds.refresh(suspend=True)
+    _refresh_suspend_depth += 1
+    try:
+        yield
+    finally:
+        _refresh_suspend_depth -= 1
+        if not _refresh_suspend_depth:
+            cmds.refresh(suspend=False)
+
+
+@contextmanager
+def undo_chunk():
+    '''Group all commands run in this context into a single undo step.'''
+
+    cmds.undoInfo(openChunk=True)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+
 def export_shader(nodes, out_file):
     '''Export the selected shader
 
-    :param node: Name of maya shader to export
+    :param nodes: Iterable of maya shading nodes to export
     :param out_file: Filepath of output maya file
     '''
 
+    nodes = list(nodes)
     with selection(nodes, replace=True, noExpand=True):
         with no_namespaces(get_history(nodes)):
             cmds.file(
@@ -192,8 +258,16 @@ def make_namespace(in_file, namespace=None):
     return namespace.replace('_shadingGroups', '').upper()
 
 
-def reference_in_scene(in_file):
+def get_reference_paths():
+    '''Get the file paths of all references in the scene.
+
+    Loose reference nodes are skipped and copy numbers like {1} are
+    stripped from the paths.
+
+    :returns: dict mapping reference node names to reference file paths
+    '''
 
+    paths = {}
     for ref in cmds.ls(references=True):
         try:
             path = cmds.referenceQuery(ref, filename=True)
@@ -201,9 +275,23 @@ def reference_in_scene(in_file):
             if "not associated with a reference file" in str(e):
                 continue
             raise
-        if os.path.abspath(path) == os.path.abspath(in_file):
-            return True
-    return False
+        paths[ref] = path.split('{')[0]
+    return paths
+
+
+def normalize_path(path):
+    '''Normalize a file path for comparison with other file paths.'''
+
+    return os.path.normcase(os.path.abspath(path))
+
+
+def reference_in_scene(in_file):
+
+    ref_paths = set(
+        normalize_path(path)
+        for path in get_reference_paths().values()
+    )
+    return normalize_path(in_file) in ref_paths
 
 
 def get_shader(node):
@@ -215,44 +303,105 @@ def get_shader(node):
     node_type = cmds.nodeType(node)
 
     if node_type == 'transform':
-        shape = get_shape(node)
+        shape = get_transform_shape(node)
         if not shape:
             return
     elif node_type == 'mesh':
         shape = node
 
-    try:
-        shading_engine = cmds.listConnections(shape, type='shadingEngine')[0]
-    except IndexError:
+    shading_engine = get_connected_shading_engine(get_mfn(shape).object())
+    if shading_engine is None:
         raise Exception('{} is not attached to a shading engine'.format(shape))
 
-    try:
-        shader = cmds.listConnections(shading_engine + '.surfaceShader')[0]
-    except IndexError:
-        raise Exception('{} shadingEngine has no surfaceShader attached'.format(shading_engine))
+    sg_mfn = om.MFnDependencyNode(shading_engine)
+    sources = sg_mfn.findPlug('surfaceShader', False).connectedTo(True, False)
+    if not sources:
+        raise Exception('{} shadingEngine has no surfaceShader attached'.format(sg_mfn.name()))
 
-    return shader
+    return om.MFnDependencyNode(sources[0].node()).name()
 
 
-def node_from_id(_id):
+def get_connected_shading_engine(mobject):
+    '''Get the MObject of the first shadingEngine connected to mobject.
+
+    Walks the node's plugs with the API instead of calling listConnections.
+    '''
+
+    mfn = om.MFnDependencyNode(mobject)
+    for plug in mfn.getConnections():
+        for other in plug.connectedTo(True, True):
+            other_node = other.node()
+            if other_node.hasFn(om.MFn.kShadingEngine):
+                return other_node
+
+
+_id_cache = {}
+
+
+def get_id_map():
+    '''Get a dict mapping meta_id values to the nodes they are on.'''
 
+    id_map = {}
     nodes = cmds.ls('*.meta_id', objectsOnly=True, recursive=True, long=True)
     for node in nodes:
-        node_id = cmds.getAttr(node + '.meta_id')
-        if str(node_id) == str(_id):
-            return node
+        node_id = str(cmds.getAttr(node + '.meta_id'))
+        if node_id not in id_map:
+            id_map[node_id] = node
+    return id_map
+
+
+def has_id(node, _id):
+    '''Check if node exists and has the meta_id _id'''
+
+    try:
+        return str(cmds.getAttr(node + '.meta_id')) == str(_id)
+    except ValueError:
+        return False
+
+
+def node_from_id(_id):
+    '''Find the node with the meta_id _id.
+
+    Lookups are served from a cache of all meta_ids in the scene. A cached
+    node is verified before it is returned, and the cache is rebuilt when
+    it is missing or stale.
+    '''
+
+    _id = str(_id)
+    node = _id_cache.get(_id)
+    if node is None or not has_id(node, _id):
+        _id_cache.clear()
+        _id_cache.update(get_id_map())
+        node = _id_cache.get(_id)
+    return node
 
 
 def add_id(node):
 
-    attr = node + '.meta_id'
-    if not cmds.objExists(attr):
-        cmds.addAttr(node, ln='meta_id', dt='string')
+    return tag_ids([node])[node]
+
+
+def tag_ids(nodes):
+    '''Give each node a new meta_id, adding the attribute where missing.
+
+    The attribute check goes through the node's MFnDependencyNode, so it
+    works however the node is named, without a cmds call per node.
+
+    :param nodes: List of node names
+    :returns: dict mapping nodes to their new meta_id
+    '''
+
+    ids = {}
+    for node in nodes:
+        if not get_mfn(node).hasAttribute('meta_id'):
+            cmds.addAttr(node, ln='meta_id', dt='string')
 
-    identifier = str(uuid.uuid1())
-    cmds.setAttr(attr, identifier, type='string')
+        identifier = str(uuid.uuid4())
+        cmds.setAttr(node + '.meta_id', identifier, type='string')
+        _id_cache[identifier] = node
+        ids[node] = identifier
 
-    return identifier
+    return ids
 
 
 def get_shading_groups(node):
@@ -264,17 +413,47 @@ def get_shading_groups(node):
     node_type = cmds.nodeType(node)
 
     if node_type == 'transform':
-        shape = get_shape(node)
+        shape = get_transform_shape(node)
         if not shape:
             return
 
-    elif node_type in ['mesh', 'nurbsSurface']:
+    elif node_type in SHAPE_TYPES:
         shape = node
 
     shading_engines = cmds.listConnections(shape, type='shadingEngine')
     return shading_engines
 
 
+def get_shading_groups_of(nodes):
+    '''Get the set of shading groups applied to any of the given transforms
+    or shapes.
+
+    Uses one batched listConnections call for all shapes instead of
+    querying each node separately.
+
+    :param nodes: List of transform or shape nodes
+    '''
+
+    if not nodes:
+        return set()
+
+    shapes = cmds.ls(nodes, type=SHAPE_TYPES, long=True) or []
+    transforms = cmds.ls(nodes, type='transform', long=True)
+    if transforms:
+        shapes.extend(cmds.listRelatives(
+            transforms,
+            shapes=True,
+            noIntermediate=True,
+            type=SHAPE_TYPES,
+            fullPath=True,
+        ) or [])
+
+    if not shapes:
+        return set()
+
+    return set(cmds.listConnections(shapes, type='shadingEngine') or ())
+
+
 def strip_namespaces(nodes):
     '''Fuck da namespaces'''
 
@@ -284,19 +463,20 @@ def strip_namespaces(nodes):
 def strip_namespace(node):
     '''Fuck da namespace'''
 
-    component = None
-    if '.' in node:
-        node, component = node.split('.')
+    if ':' not in node:
+        return str(node)
 
-    if ':' in node:
-        no_namespace = str(node.split(':')[-1])
+    dot = node.find('.')
+    if dot >= 0:
+        node, component = node[:dot], node[dot:]
     else:
-        no_namespace = str(node)
+        component = ''
 
-    if component:
-        no_namespace = '.'.join([no_namespace, component])
+    colon = node.rfind(':')
+    if colon >= 0:
+        node = node[colon + 1:]
 
-    return no_namespace
+    return str(node + component)
 
 
 def filter_bad_face_assignments(nodes):
@@ -308,21 +488,29 @@ def filter_bad_face_assignments(nodes):
     For example if a an object has 10 faces, "node.f[0:9]", is a bad face
     assignment. We will just shorten this to "node".
     '''
-    import re
-    pattern = re.compile(r'\.f\[0:(\d+)\]$')
 
-    shorts = []
+    return list(iter_bad_face_assignments(nodes))
+
+
+def iter_bad_face_assignments(nodes):
+    '''Generator version of filter_bad_face_assignments.'''
+
+    search = BAD_FACE_PATTERN.search
+    face_counts = {}
+
     for node in nodes:
-        match = pattern.search(node)
+        match = search(node)
         if match:
             short_name = node.replace(match.group(0), '')
             end = int(match.group(1))
-            num_faces = cmds.polyEvaluate(short_name, face=True)
+            num_faces = face_counts.get(short_name)
+            if num_faces is None:
+                num_faces = cmds.polyEvaluate(short_name, face=True)
+                face_counts[short_name] = num_faces
             if end + 1 == num_faces:
-                shorts.append(short_name)
+                yield short_name
                 continue
-        shorts.append(node)
-    return shorts
+        yield node
 
 
 def shortest_dag_path(dag_path):
@@ -364,12 +552,12 @@ def shorten_name(node):
     '''Shorten name removing namespaces'''
 
     node = shortest_dag_path(node)
-    if '|' in node:
-        nodes = node.split('|')
-        stripped = [strip_namespace(n) for n in nodes]
-        return '|'.join(stripped)
+    if ':' not in node:
+        return node
 
-    return strip_namespace(node)
+    obj, dot, component = node.partition('.')
+    obj = '|'.join(part.rpartition(':')[2] for part in obj.split('|'))
+    return str(obj + dot + component)
 
 
 def shorten_names(nodes):
@@ -397,43 +585,101 @@ def find_shape(shape):
     return match
 
 
-def find_members(members):
+def find_shapes(shapes):
+    '''Batched version of find_shape.
 
-    found = []
-    for member in members:
+    Exact names are looked up with a single ls call and matched back to
+    each shape by their namespace stripped dag path. Only shapes without
+    an exact match fall back to a per shape wildcard lookup.
 
-        # Original lookup failed when Deformers were added in rig/animation
-        # ms = cmds.ls(member, recursive=True, long=True)
-        # if ms:
-        #     found.extend(ms)
-        #     continue
+    :param shapes: Iterable of shape names as stored in a shadeset
+    :returns: dict mapping shape names to lists of matching nodes
+    '''
+
+    shapes = list(shapes)
+    if not shapes:
+        return {}
+
+    matches_by_leaf = {}
+    for match in cmds.ls(shapes, recursive=True, long=True) or []:
+        stripped = match
+        if ':' in match:
+            stripped = '|'.join(p.rpartition(':')[2] for p in match.split('|'))
+        leaf = stripped.rpartition('|')[2]
+        matches_by_leaf.setdefault(leaf, []).append((stripped, match))
+
+    results = {}
+    for shape in shapes:
+        candidates = matches_by_leaf.get(shape.rpartition('|')[2], ())
+        if shape.startswith('|'):
+            matches = [m for stripped, m in candidates if stripped == shape]
+        else:
+            tail = '|' + shape
+            matches = [m for stripped, m in candidates
+                       if stripped.endswith(tail)]
+
+        if not matches:
+            matches = cmds.ls(shape + '*', recursive=True, long=True)
 
-        # Cast a broader net
+        results[shape] = matches
+
+    return results
+
+
+def find_members(members):
+    '''Find scene nodes and components matching stored member names.
+
+    All members are looked up with a single ls call.
+    '''
+
+    # Original lookup failed when Deformers were added in rig/animation
+    # so cast a broader net by matching any node starting with the name
+    patterns = []
+    for member in members:
         parts = member.split('.')
-        member = parts[0] + '*'
-        if len(parts) == 2:
-            component = parts[1]
-            member += '.' + component
         if len(parts) > 2:
-            raise NameError('Too many parts in name: ' + member)
+            raise NameError('Too many parts in name: ' + parts[0] + '*')
+
+        pattern = parts[0] + '*'
+        if len(parts) == 2:
+            pattern += '.' + parts[1]
+        patterns.append(pattern)
+
+    if not patterns:
+        return []
+
+    return cmds.ls(patterns, recursive=True, long=True) or []
 
-        ms = cmds.ls(member, recursive=True, long=True)
-        found.extend(ms)
 
-    return found
+def get_descendants(nodes):
+    '''Get the full paths of all dag descendants of nodes as a set.'''
+
+    if not nodes:
+        return set()
+    return set(
+        cmds.listRelatives(nodes, allDescendents=True, fullPath=True) or ()
+    )
+
+
+def members_in_hierarchy(members, descendants):
+    '''Filter members to those whose node is in the descendants set returned
+    by get_descendants.'''
+
+    return [m for m in members if m.partition('.')[0] in descendants]
 
 
 def member_in_hierarchy(member, *candidates):
-    for candidate in candidates:
-        if candidate in get_parents(member):
-            return True
+    parents = frozenset(get_parents(member))
+    return not parents.isdisjoint(candidates)
 
 
-def apply_shader(shape, shader):
+def apply_shader(shape, shader, reset=False):
     '''Apply a shader to the specified shape
 
     :param shape: Shape used in shader assignment
     :param shader: Shader to apply
+    :param reset: Assign initialShadingGroup first to clear existing
+        per-face assignments
     '''
 
     sg = cmds.listConnections(shader, type='shadingEngine')
@@ -443,10 +689,9 @@ def apply_shader(shape, shader):
     else:
         sg = sg[0]
 
-    if not cmds.sets(shape, isMember=sg):
-        # force initial shading assignment first...
+    if reset:
         cmds.sets(shape, edit=True, forceElement="initialShadingGroup")
-        cmds.sets(shape, edit=True, forceElement=sg)
+    cmds.sets(shape, edit=True, forceElement=sg)
 
 
 def assign_shading_group(shading_group, members):
@@ -459,7 +704,7 @@ def assign_shading_group(shading_group, members):
 def get_prefixed_attrs(node, prefix):
     '''Get all node attributes with the specified prefix'''
 
-    return [attr for attr in cmds.listAttr(node) if attr.startswith(prefix)]
+    return cmds.listAttr(node, string=prefix + '*') or []
 
 
 def get_enum_options(node, attr):
@@ -485,7 +730,59 @@ def get_child_attrs(node, attr):
 
 
 def get_attr_data(node, attr):
-    '''Gets data for attribute'''
+    '''Gets data for attribute
+
+    Attribute metadata is read from the node's attribute definition using
+    API 2.0. Only the value, type and nice name are queried with cmds.
+    '''
+
+    path = node + '.' + attr
+    if not cmds.objExists(path):
+        return
+
+    mfn = get_mfn(node)
+    if not mfn.hasAttribute(attr):
+        # Nested paths like parent.child can not be looked up by name
+        return get_attr_data_cmds(node, attr)
+
+    mattr = mfn.attribute(attr)
+    fn_attr = om.MFnAttribute(mattr)
+
+    children = None
+    if mattr.hasFn(om.MFn.kCompoundAttribute):
+        fn_compound = om.MFnCompoundAttribute(mattr)
+        children = []
+        for i in range(fn_compound.numChildren()):
+            fn_child = om.MFnAttribute(fn_compound.child(i))
+            children.append(dict(
+                name=fn_child.name,
+                type=cmds.getAttr(node + '.' + fn_child.name, type=True),
+                keyable=fn_child.keyable,
+            ))
+        children = children or None
+
+    options = None
+    if mattr.hasFn(om.MFn.kEnumAttribute):
+        options = get_enum_options(node, attr)
+
+    value = cmds.getAttr(path)
+    if isinstance(value, list):
+        value = value[0]
+    return dict(
+        name=attr,
+        value=value,
+        type=cmds.getAttr(path, type=True),
+        short=fn_attr.shortName,
+        nice=cmds.attributeName(path, nice=True),
+        compound=bool(children),
+        children=children,
+        options=options,
+        keyable=fn_attr.keyable,
+    )
+
+
+def get_attr_data_cmds(node, attr):
+    '''Gets data for attribute using only cmds queries'''
 
     path = node + '.' + attr
     if cmds.objExists(path):
@@ -506,17 +803,31 @@ def get_attr_data(node, attr):
         )
 
 
+# Attribute types added with the dataType flag instead of attributeType
+DATA_TYPES = frozenset([
+    'matrix', 'string', 'stringArray', 'doubleArray', 'Int32Array',
+    'reflectance', 'spectrum', 'float2', 'float3', 'double2',
+    'double3', 'long2', 'long3', 'short2', 'short3', 'vectorArray',
+    'nurbsCurve', 'nurbsSurface', 'mesh', 'lattice', 'pointArray'
+])
+
+# Attribute types whose values are unpacked into setAttr arguments
+UNPACKABLE_TYPES = frozenset([
+    'float2', 'float3', 'double2', 'double3', 'long2', 'long3',
+    'compound', 'spectrum', 'reflectance', 'matrix', 'fltMatrix',
+    'reflectanceRBG', 'spectrumRGB', 'short2', 'short3', 'doubleArray',
+    'Int32Array', 'vectorArray'
+])
+
+# Attribute types that must be passed to setAttr with the type flag
+TYPEABLE_TYPES = UNPACKABLE_TYPES | frozenset(['string', 'byte'])
+
+
 def add_attr_kwargs(attr_data):
     '''Get kwargs suitable for adding an attribute'''
 
     type_flag = 'at'
-    dt_attrs = [
-        'matrix', 'string', 'stringArray', 'doubleArray', 'Int32Array',
-        'reflectance', 'spectrum', 'float2', 'float3', 'double2',
-        'double3', 'long2', 'long3', 'short2', 'short3', 'vectorArray',
-        'nurbsCurve', 'nurbsSurface', 'mesh', 'lattice', 'pointArray'
-    ]
-    if attr_data['type'] in dt_attrs:
+    if attr_data['type'] in DATA_TYPES:
         type_flag = 'dt'
     if attr_data['compound']:
         type_flag = 'at'
@@ -536,23 +847,11 @@ def add_attr_kwargs(attr_data):
 
 
 def unpackable(attr_data):
-    unpackable_types = [
-        'float2', 'float3', 'double2', 'double3', 'long2', 'long3',
-        'compound', 'spectrum', 'reflectance', 'matrix', 'fltMatrix',
-        'reflectanceRBG', 'spectrumRGB', 'short2', 'short3', 'doubleArray',
-        'Int32Array', 'vectorArray'
-    ]
-    return attr_data['type'] in unpackable_types
+    return attr_data['type'] in UNPACKABLE_TYPES
 
 
 def typeable(attr_data):
-    typeable_attrs = [
-        'float2', 'float3', 'double2', 'double3', 'long2', 'long3',
-        'compound', 'spectrum', 'reflectance', 'matrix', 'fltMatrix',
-        'reflectanceRBG', 'spectrumRGB', 'short2', 'short3', 'doubleArray',
-        'Int32Array', 'vectorArray', 'string', 'byte'
-    ]
-    return attr_data['type'] in typeable_attrs
+    return attr_data['type'] in TYPEABLE_TYPES
 
 
 def set_attr_data(node, attr_data):
@@ -571,6 +870,15 @@ def set_attr_data(node, attr_data):
                     keyable=child['keyable'],
                     parent=attr_data['name']
                 )
+
+    plug = get_plug(path)
+    if plug.isLocked or plug.isDestination:
+        cmds.warning(
+            "The attribute '{}' is locked or connected and cannot be "
+            "modified.".format(path)
+        )
+        return
+
     args = [path]
     if unpackable(attr_data):
         args.extend(attr_data['value'])
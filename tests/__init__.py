@@ -1,7 +1,14 @@
 import os
-from functools import partial
 
-data_path = partial(
-    os.path.join,
-    os.path.abspath(os.path.dirname(__file__)),
-    'data')
+_data_root = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
+_data_paths = {}
+
+
+def data_path(*parts):
+    '''Get a path relative to the tests data directory.'''
+
+    try:
+        return _data_paths[parts]
+    except KeyError:
+        path = _data_paths[parts] = os.path.join(_data_root, *parts)
+        return path
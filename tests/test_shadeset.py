@@ -1,113 +1,226 @@
 # -*- coding: utf-8 -*-
 import unittest
 import os
-from shadeset import ShadeSet
+import shutil
+import tempfile
+from shadeset import ShadeSet, lib, utils
+from shadeset.packages import yaml
 from . import data_path
 from maya import standalone, cmds
 
 
+EXPECTED_KEYS = frozenset(['shadingGroups', 'customAttributes', 'ObjectSets'])
+EXPECTED_FILES = frozenset(['shadeset.yml', 'shadeset_shadingGroups.mb'])
+EXPECTED_SHADERS = {
+    'pSphere1': 'phongE1',
+    'pSphere2': 'phong1',
+    'pSphere3': 'blinn1',
+    'pSphere4': 'rampShader1',
+    'pSphere5': 'surfaceShader1',
+}
+EXPECTED_NOSHADERS = {
+    'pSphere1': 'lambert1',
+    'pSphere2': 'lambert1',
+    'pSphere3': 'lambert1',
+    'pSphere4': 'lambert1',
+    'pSphere5': 'lambert1',
+}
+SPHERE_COUNT = 5
+_owns_standalone = False
+
+
 def setUpModule():
-    standalone.initialize()
+    global _owns_standalone
+
+    # cmds is only populated once maya is initialized, leave an existing
+    # session alone so other test modules can share it
+    if not hasattr(cmds, 'about'):
+        standalone.initialize()
+        _owns_standalone = True
+
+    for scene in ('base_scene.mb', 'noshaders_scene.mb'):
+        preload(data_path(scene))
 
 
 def tearDownModule():
-    standalone.uninitialize()
+    if _owns_standalone:
+        standalone.uninitialize()
 
 
-class TestShadeSet(unittest.TestCase):
+def preload(path, chunk_size=1 << 20):
+    '''Read a file once so later scene opens are served from the page cache.'''
 
-    def setUp(self):
-        self.base_scene = data_path('base_scene.mb')
-        self.noshader_scene = data_path('noshaders_scene.mb')
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        while os.read(fd, chunk_size):
+            pass
+    finally:
+        os.close(fd)
 
-    def test_gather_selection(self):
-        '''Test gather shadeset from selection'''
 
-        cmds.file(self.base_scene, open=True)
-        cmds.select('pSphere*')
-        shade_set = ShadeSet.gather(selection=True, render_layers=False)
-        expected_shade_set = {
-            'geometry': {
-                '|pSphere1': 'phongE1',
-                '|pSphere2': 'phong1',
-                '|pSphere3': 'blinn1',
-                '|pSphere4': 'rampShader1',
-                '|pSphere5': 'surfaceShader1'},
-            'shaders': {
-                'blinn1': 'shaders/blinn1.mb',
-                'phong1': 'shaders/phong1.mb',
-                'phongE1': 'shaders/phongE1.mb',
-                'rampShader1': 'shaders/rampShader1.mb',
-                'surfaceShader1': 'shaders/surfaceShader1.mb'}
-        }
-        assert shade_set == expected_shade_set
-
-    def test_gather_noselection(self):
-        '''Test gather shadeset no selection'''
-
-        cmds.file(self.base_scene, open=True)
-        shade_set = ShadeSet.gather(selection=False, render_layers=False)
-        expected_shade_set = {
-            'geometry': {
-                '|pSphere1': 'phongE1',
-                '|pSphere2': 'phong1',
-                '|pSphere3': 'blinn1',
-                '|pSphere4': 'rampShader1',
-                '|pSphere5': 'surfaceShader1'},
-            'shaders': {
-                'blinn1': 'shaders/blinn1.mb',
-                'phong1': 'shaders/phong1.mb',
-                'phongE1': 'shaders/phongE1.mb',
-                'rampShader1': 'shaders/rampShader1.mb',
-                'surfaceShader1': 'shaders/surfaceShader1.mb'}
-        }
-        assert shade_set == expected_shade_set
+def open_scene(path):
+    '''Open a fixture scene with viewport refresh suspended.'''
 
-    def test_gather_noshaders(self):
-        '''Test gather shadeset with no shaders'''
+    with utils.suspended_refresh():
+        cmds.file(path, open=True, force=True, prompt=False)
 
-        cmds.file(self.noshader_scene, open=True)
-        cmds.select('pSphere*')
-        shade_set = ShadeSet.gather(selection=True, render_layers=False)
-        expected_shade_set = {
-            'geometry': {
-                '|pSphere1': 'lambert1',
-                '|pSphere2': 'lambert1',
-                '|pSphere3': 'lambert1',
-                '|pSphere4': 'lambert1',
-                '|pSphere5': 'lambert1'},
-            'shaders': {'lambert1': 'shaders/lambert1.mb'}
-        }
-        assert shade_set == expected_shade_set
-
-    def test_round_trip(self):
-        '''Test shadeset round-trip'''
-
-        cmds.file(self.base_scene, open=True)
+
+def new_sphere_scene(count=SPHERE_COUNT):
+    '''Start a new scene with unshaded spheres named like the fixture scenes.
+
+    Cheaper than opening noshaders_scene.mb when a test only needs bare
+    geometry to apply a shadeset to.
+    '''
+
+    cmds.file(new=True, force=True)
+    for i in range(1, count + 1):
+        cmds.polySphere(name='pSphere{}'.format(i))
+
+
+def get_surface_shaders(shade_set, key=None):
+    '''Map the transform of each shading group member in shade_set to the
+    surfaceShader of its shading group.
+
+    Shading group names are resolved in the open scene, so call this while
+    the scene the shadeset was gathered from is open.
+
+    :param shade_set: Gathered ShadeSet
+    :param key: Optional function applied to each shader, like cmds.nodeType
+    '''
+
+    shaders = {}
+    for sg, sg_data in shade_set['shadingGroups'].items():
+        shader = cmds.listConnections(
+            sg + '.surfaceShader',
+            source=True,
+            destination=False,
+        )[0]
+        if key:
+            shader = key(shader)
+
+        for member in sg_data['members']:
+            node = member.partition('.')[0]
+            if cmds.ls(node, shapes=True):
+                node = cmds.listRelatives(node, parent=True)[0]
+            shaders[node] = shader
+
+    return shaders
+
+
+def as_loaded(data):
+    '''Round-trip data through yaml, converting tuples to lists the way a
+    loaded shadeset does.'''
+
+    return yaml.safe_load(yaml.safe_dump(data))
+
+
+class TestShadeSet(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.base_scene = data_path('base_scene.mb')
+
+        # Gather tests only read the scene, so it is opened once per class
+        open_scene(cls.base_scene)
+
+    def test_gather(self):
+        '''Test gather shadeset with and without a selection'''
+
+        for selection in (True, False):
+            if selection:
+                cmds.select('pSphere*')
+            else:
+                cmds.select(clear=True)
+            shade_set = ShadeSet.gather(
+                selection=selection,
+                render_layers=False,
+            )
+            msg = 'selection={}'.format(selection)
+            self.assertEqual(set(shade_set), EXPECTED_KEYS, msg)
+            self.assertEqual(
+                get_surface_shaders(shade_set),
+                EXPECTED_SHADERS,
+                msg,
+            )
+
+
+class TestRoundTrip(unittest.TestCase):
+    '''Test shadeset round-trip
+
+    The shadeset is gathered and exported once, each test checks one stage
+    of the round-trip.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        open_scene(data_path('base_scene.mb'))
         cmds.select('pSphere*')
-        pre_shade_set = ShadeSet.gather(selection=True, render_layers=False)
-        export_path = data_path('testset')
-        pre_shade_set.export(export_path)
-
-        expected_files = (
-            data_path('testset', 'shadeset.yml'),
-            data_path('testset', 'shaders', 'phongE1.mb'),
-            data_path('testset', 'shaders', 'phong1.mb'),
-            data_path('testset', 'shaders', 'blinn1.mb'),
-            data_path('testset', 'shaders', 'rampShader1.mb'),
-            data_path('testset', 'shaders', 'surfaceShader1.mb'),
+        cls.pre_shade_set = ShadeSet.gather(
+            selection=True,
+            render_layers=False,
         )
+        # Shader types survive the renaming done when shaders are imported
+        cls.pre_shader_types = get_surface_shaders(
+            cls.pre_shade_set,
+            key=cmds.nodeType,
+        )
+        cls.export_path = tempfile.mkdtemp(prefix='shadeset_')
+
+        # Keep load caches out of the user's real cache root
+        cls.cache_root = lib.get_cache_root()
+        lib.set_cache_root(os.path.join(cls.export_path, '.cache'))
+
+        cls.pre_shade_set.export(cls.export_path, 'shadeset')
+        cls.shade_path = os.path.join(cls.export_path, 'shadeset.yml')
+
+    @classmethod
+    def tearDownClass(cls):
+        lib.set_cache_root(cls.cache_root)
+        shutil.rmtree(cls.export_path, ignore_errors=True)
+
+    def test_files_exist(self):
+        '''Test shadeset export writes the expected files'''
 
-        assert all([os.path.exists(f) for f in expected_files])
+        # One directory listing instead of a stat per file
+        exported_files = set(os.listdir(self.export_path))
+        self.assertLessEqual(EXPECTED_FILES, exported_files)
 
-        cmds.file(self.noshader_scene, open=True)
-        shade_set = ShadeSet.load(data_path('testset'))
+    def test_load_equals_gather(self):
+        '''Test loading an exported shadeset matches the gathered one'''
 
-        assert pre_shade_set == shade_set
+        # Parse the yml itself rather than a cached pickle
+        shade_set = ShadeSet.load(self.shade_path, cache=False)
+        self.assertEqual(as_loaded(dict(self.pre_shade_set)), shade_set)
 
+    def test_apply_matches(self):
+        '''Test applying an exported shadeset reproduces the gathered one'''
+
+        new_sphere_scene()
+        shade_set = ShadeSet.load(self.shade_path)
+        shade_set.import_()
         shade_set.apply()
 
         cmds.select('pSphere*', replace=True)
         post_shade_set = ShadeSet.gather(selection=True, render_layers=False)
+        self.assertEqual(
+            self.pre_shader_types,
+            get_surface_shaders(post_shade_set, key=cmds.nodeType),
+        )
+
+
+class TestShadeSetNoShaders(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.noshader_scene = data_path('noshaders_scene.mb')
+        open_scene(cls.noshader_scene)
 
-        assert pre_shade_set == post_shade_set
+    def test_gather_noshaders(self):
+        '''Test gather shadeset with no shaders'''
+
+        cmds.select('pSphere*')
+        shade_set = ShadeSet.gather(selection=True, render_layers=False)
+        self.assertEqual(set(shade_set), EXPECTED_KEYS)
+        self.assertEqual(get_surface_shaders(shade_set), EXPECTED_NOSHADERS)